@@ -1,24 +1,28 @@
-from fastapi import Request, Depends, HTTPException, status, Header
-from typing import Annotated
-from app.core.config import settings
-from app.services.asr_service import ASRService
+import hmac
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from typing import Annotated, Optional
+from app.core.config import API_KEY_BYTES
 
+# 由 FastAPI 解析 Authorization 头并在 OpenAPI 文档中声明 Bearer 鉴权；
+# 关闭 auto_error 以便自行返回 401 及原有的错误信息
+bearer_scheme = HTTPBearer(auto_error=False)
 
-def get_asr_service(request: Request) -> ASRService:
-    """从应用状态中获取 ASR 服务单例"""
-    return request.app.state.asr_service
 
-
-async def verify_api_key(authorization: Annotated[str, Header()] = None):
+async def verify_api_key(
+        request: Request,
+        credentials: Annotated[Optional[HTTPAuthorizationCredentials], Depends(bearer_scheme)] = None
+):
     """验证 Bearer Token"""
-    if not authorization:
+    if credentials is None:
+        # HTTPBearer 对非 Bearer 方案或空 token 同样返回 None，此时头部存在，应视为密钥无效
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authorization header is missing",
+            detail="Invalid API Key" if request.headers.get("authorization") else "Authorization header is missing",
         )
 
-    scheme, _, token = authorization.partition(' ')
-    if scheme.lower() != 'bearer' or token != settings.API_KEY:
+    # 使用 hmac.compare_digest 做恒定时间比较，避免计时侧信道
+    if not hmac.compare_digest(credentials.credentials.encode(), API_KEY_BYTES):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API Key",
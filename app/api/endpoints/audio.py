@@ -1,23 +1,31 @@
-import shutil
-import tempfile
+import hashlib
+import logging
 import os
+import tempfile
+import urllib.parse
 from enum import Enum
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from fastapi.responses import Response, JSONResponse, PlainTextResponse
 from typing import Annotated
-from fastapi import Request
+
+# 异步文件读写与 HTTP 流式下载，避免在事件循环中执行阻塞 I/O
+import anyio
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 
 from app.api import deps
-from app.services.asr_service import ASRService
+from app.api.responses import OrjsonResponse
+from app.core.config import settings
+from app.services.batcher import get_transcription_batcher
+from app.services.chunk_store import concat_files, get_chunk_store
+from app.services.http_client import get_http_client
+from app.services.result_cache import get_transcription_cache
 from app.services import formatters
 
-import logging
-# 新增导入：用于从 URL 流式下载
-import urllib.request
-import urllib.parse
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# 流式读写时每次处理的字节数
+UPLOAD_CHUNK_SIZE = 1 << 20
+
 
 class AudioResponseFormat(str, Enum):
     JSON = "json"
@@ -27,6 +35,33 @@ class AudioResponseFormat(str, Enum):
     VTT = "vtt"
 
 
+# 各响应格式对应的 (格式化函数, 响应类)
+_RESPONSE_FORMATTERS = {
+    AudioResponseFormat.JSON: (formatters.to_simple_json, OrjsonResponse),
+    AudioResponseFormat.VERBOSE_JSON: (formatters.to_verbose_json, OrjsonResponse),
+    AudioResponseFormat.TEXT: (formatters.to_text, PlainTextResponse),
+    AudioResponseFormat.SRT: (formatters.to_srt, PlainTextResponse),
+    AudioResponseFormat.VTT: (formatters.to_vtt, PlainTextResponse),
+}
+
+
+def _format_response(result: dict, response_format: AudioResponseFormat):
+    """按请求的格式构造响应"""
+    formatter, response_class = _RESPONSE_FORMATTERS[response_format]
+    return response_class(content=formatter(result))
+
+
+async def _transcribe_cached(audio_file_path: str, digest: str, hotword: str = None) -> dict:
+    """按 (内容摘要, 热词) 查找识别结果缓存，未命中时提交识别并写入缓存"""
+    cache = get_transcription_cache()
+    key = (digest, hotword)
+    result = cache.get(key)
+    if result is None:
+        result = await get_transcription_batcher().submit(audio_file_path, hotword=hotword)
+        cache.put(key, result)
+    return result
+
+
 @router.post(
     "/v1/audio/transcriptions",
     dependencies=[Depends(deps.verify_api_key)],
@@ -38,7 +73,6 @@ async def create_transcription(
         model: Annotated[str, Form(...)],  
         response_format: Annotated[AudioResponseFormat, Form()] = AudioResponseFormat.JSON,
         prompt: Annotated[str, Form()] = None,  # 对应 FunASR 的 hotword
-        asr_service: ASRService = Depends(deps.get_asr_service)
 ):
     """
     将音频文件转录为文本。
@@ -48,32 +82,24 @@ async def create_transcription(
     - **response_format**: 返回结果的格式。
     - **prompt**: 可选的提示词/热词，以提高特定词汇的识别准确率。
     """
-    # 使用临时文件处理上传的音频
+    # 使用临时文件处理上传的音频，分块异步写入以免阻塞事件循环，并顺带计算内容摘要
+    fd, tmp_audio_path = tempfile.mkstemp(suffix=f"_{file.filename}", dir=settings.TEMP_DIR or None)
+    os.close(fd)
+    hasher = hashlib.sha256()
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file.filename}") as tmp_audio_file:
-            shutil.copyfileobj(file.file, tmp_audio_file)
-            tmp_audio_path = tmp_audio_file.name
+        async with await anyio.open_file(tmp_audio_path, "wb") as tmp_audio_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                hasher.update(chunk)
+                await tmp_audio_file.write(chunk)
     finally:
-        file.file.close()
+        await file.close()
 
     try:
-        # 执行语音识别
-        result = asr_service.transcribe(
-            tmp_audio_path, 
-            hotword=prompt,
-        )
+        # 执行语音识别，相同内容与热词的重复请求直接复用结果
+        result = await _transcribe_cached(tmp_audio_path, hasher.hexdigest(), hotword=prompt)
 
         # 根据请求的格式返回结果
-        if response_format == AudioResponseFormat.JSON:
-            return JSONResponse(content=formatters.to_simple_json(result))
-        elif response_format == AudioResponseFormat.VERBOSE_JSON:
-            return JSONResponse(content=formatters.to_verbose_json(result))
-        elif response_format == AudioResponseFormat.TEXT:
-            return PlainTextResponse(content=formatters.to_text(result))
-        elif response_format == AudioResponseFormat.SRT:
-            return PlainTextResponse(content=formatters.to_srt(result), media_type="text/plain")
-        elif response_format == AudioResponseFormat.VTT:
-            return PlainTextResponse(content=formatters.to_vtt(result), media_type="text/plain")
+        return _format_response(result, response_format)
 
     except Exception as e:
         # 处理可能的识别错误
@@ -81,7 +107,6 @@ async def create_transcription(
         raise HTTPException(status_code=500, detail=f"An error occurred during transcription: {str(e)}")
     finally:
         # 清理临时文件
-        import os
         os.remove(tmp_audio_path)
 
 
@@ -93,18 +118,10 @@ async def upload_chunk(request: Request):
     分块上传接口：
     - 当 Content-Type 为 application/offset+octet-stream 或存在 upload-* 头时，从请求头读取分块元信息，原样写入临时目录；
     - 否则回退到 multipart/form-data 读取 form 字段。
-    临时目录使用 tempfile.gettempdir()，兼容不同操作系统。
+    连续的小分块会先在内存中累积再批量落盘，临时目录使用 tempfile.gettempdir()，兼容不同操作系统。
     """
     content_type = request.headers.get("content-type", "")
 
-    # 通用：确定基础临时目录
-    def _chunk_dir(md5: str) -> str:
-        return os.path.join(tempfile.gettempdir(), "chunks", md5)
-
-    # 路径确保存在
-    def _ensure_dir(path: str):
-        os.makedirs(path, exist_ok=True)
-
     # 方案一：原始字节流（tus-js-client 透传）
     upload_hdr_present = (
         request.headers.get("upload-file-md5") is not None and
@@ -127,16 +144,17 @@ async def upload_chunk(request: Request):
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid chunk index or total chunks")
 
-        base_dir = _chunk_dir(file_md5)
-        _ensure_dir(base_dir)
-        # 为了合并时排序稳定，建议零填充序号
-        chunk_path = os.path.join(base_dir, f"chunk_{chunk_index_int:06d}")
-
-        body = await request.body()
-        with open(chunk_path, "wb") as f:
-            f.write(body)
+        # 流式读取请求体，避免一次性把整个分块读入内存
+        content_length = request.headers.get("content-length")
+        received = await get_chunk_store().write_chunk_stream(
+            file_md5,
+            chunk_index_int,
+            total_chunks_int,
+            request.stream(),
+            size_hint=int(content_length) if content_length and content_length.isdigit() else None,
+        )
 
-        return {"status": "ok", "chunk_index": chunk_index_int, "filename": filename, "bytes": len(body)}
+        return {"status": "ok", "chunk_index": chunk_index_int, "filename": filename, "bytes": received}
 
     # 方案二：multipart/form-data 回退兼容
     try:
@@ -155,11 +173,7 @@ async def upload_chunk(request: Request):
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid chunk index or total chunks")
 
-        base_dir = _chunk_dir(file_md5)
-        _ensure_dir(base_dir)
-        chunk_path = os.path.join(base_dir, f"chunk_{chunk_index_int:06d}")
-        with open(chunk_path, "wb") as f:
-            f.write(await chunk.read())
+        await get_chunk_store().write_chunk(file_md5, chunk_index_int, total_chunks_int, await chunk.read())
         return {"status": "ok", "chunk_index": chunk_index_int, "filename": filename}
     except Exception as e:
         # 如果不是 multipart 或其他解析错误
@@ -169,7 +183,7 @@ async def upload_chunk(request: Request):
 
 
 @router.post("/v1/audio/merge", dependencies=[Depends(deps.verify_api_key)], tags=["Audio"])
-async def merge_chunks(request: Request, asr_service: ASRService = Depends(deps.get_asr_service)):
+async def merge_chunks(request: Request):
     """
     合并分块并进行识别：
     期待 JSON: { "fileMd5": "...", "filename": "...", "cleanup": true }
@@ -181,45 +195,53 @@ async def merge_chunks(request: Request, asr_service: ASRService = Depends(deps.
     if not file_md5:
         raise HTTPException(status_code=400, detail="fileMd5 is required")
 
-    base_dir = os.path.join(tempfile.gettempdir(), "chunks", file_md5)
-    if not os.path.isdir(base_dir):
+    # 先把仍在内存中的分块落盘
+    chunk_store = get_chunk_store()
+    await chunk_store.flush(file_md5)
+
+    base_dir = chunk_store.chunk_dir(file_md5)
+    if not chunk_store.exists(file_md5):
         raise HTTPException(status_code=400, detail="Chunk directory not found")
 
     # 收集并排序所有分块
-    chunk_files = sorted(
-        [f for f in os.listdir(base_dir) if f.startswith("chunk_")],
-        key=lambda x: int(x.split("_")[1])
-    )
+    chunk_files = chunk_store.list_chunks(file_md5)
     if not chunk_files:
         raise HTTPException(status_code=400, detail="No chunks found to merge")
 
+    # 内容摘要在上传分块时已增量算好，相同内容重复上传时直接复用识别结果
+    digest = chunk_store.digest(file_md5)
+    cache = get_transcription_cache()
+    result = cache.get((digest, None)) if digest else None
+
     merged_path = os.path.join(base_dir, filename)
-    with open(merged_path, "wb") as outfile:
-        for chunk_file in chunk_files:
-            with open(os.path.join(base_dir, chunk_file), "rb") as infile:
-                outfile.write(infile.read())
+    if result is None:
+        await concat_files(
+            [os.path.join(base_dir, f) for f in chunk_files],
+            merged_path,
+            max_workers=settings.CHUNK_MERGE_CONCURRENCY,
+        )
 
-    # 语音识别
-    result = asr_service.transcribe(merged_path)
+        # 语音识别
+        result = await get_transcription_batcher().submit(merged_path)
+        if digest:
+            cache.put((digest, None), result)
 
     # 可选清理
     if cleanup:
         try:
-            # 删除分块文件和合并后的文件
-            for f in chunk_files:
-                os.remove(os.path.join(base_dir, f))
-            os.remove(merged_path)
-            # 删除目录
-            os.rmdir(base_dir)
+            # 删除合并后的文件，再删除分块文件与目录
+            if os.path.exists(merged_path):
+                os.remove(merged_path)
+            chunk_store.remove(file_md5, chunk_files)
         except Exception as e:
             logger.warning(f"Cleanup failed for {base_dir}: {e}")
 
-    return JSONResponse(content=formatters.to_verbose_json(result))
+    return OrjsonResponse(content=formatters.to_verbose_json(result))
 
 
 # 新增：直接从 URL 拉取音频并识别
 @router.post("/v1/audio/from_url", dependencies=[Depends(deps.verify_api_key)], tags=["Audio"])
-async def transcribe_from_url(request: Request, asr_service: ASRService = Depends(deps.get_asr_service)):
+async def transcribe_from_url(request: Request):
     """
     从远程 URL（例如 MinIO 预签名链接）下载音频并进行识别，避免前端先下载。
     期待 JSON: {
@@ -234,6 +256,9 @@ async def transcribe_from_url(request: Request, asr_service: ASRService = Depend
     url = data.get("url")
     if not url:
         raise HTTPException(status_code=400, detail="url is required")
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        raise HTTPException(status_code=400, detail="url must be an absolute http(s) URL")
 
     # 可选参数
     filename = data.get("filename")
@@ -243,36 +268,29 @@ async def transcribe_from_url(request: Request, asr_service: ASRService = Depend
 
     # 推断文件名
     if not filename:
-        parsed = urllib.parse.urlparse(url)
         base = os.path.basename(parsed.path) or "audio_from_url"
         filename = base
 
     # 以临时文件保存。
     tmp_path = None
     try:
-        fd, tmp_path = tempfile.mkstemp(suffix=f"_{filename}")
+        fd, tmp_path = tempfile.mkstemp(suffix=f"_{filename}", dir=settings.TEMP_DIR or None)
         os.close(fd)
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req) as resp, open(tmp_path, "wb") as out:
-            shutil.copyfileobj(resp, out)
+        hasher = hashlib.sha256()
+        async with get_http_client().stream("GET", url, headers=headers) as resp:
+            resp.raise_for_status()
+            async with await anyio.open_file(tmp_path, "wb") as out:
+                async for chunk in resp.aiter_bytes(UPLOAD_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    await out.write(chunk)
 
         # 执行识别
-        result = asr_service.transcribe(tmp_path, hotword=prompt)
-
-        # 返回格式处理
-        if response_format_str == AudioResponseFormat.JSON.value:
-            return JSONResponse(content=formatters.to_simple_json(result))
-        elif response_format_str == AudioResponseFormat.VERBOSE_JSON.value:
-            return JSONResponse(content=formatters.to_verbose_json(result))
-        elif response_format_str == AudioResponseFormat.TEXT.value:
-            return PlainTextResponse(content=formatters.to_text(result))
-        elif response_format_str == AudioResponseFormat.SRT.value:
-            return PlainTextResponse(content=formatters.to_srt(result), media_type="text/plain")
-        elif response_format_str == AudioResponseFormat.VTT.value:
-            return PlainTextResponse(content=formatters.to_vtt(result), media_type="text/plain")
-        else:
-            # 未知格式，默认 verbose_json
-            return JSONResponse(content=formatters.to_verbose_json(result))
+        result = await _transcribe_cached(tmp_path, hasher.hexdigest(), hotword=prompt)
+
+        # 返回格式处理；未知格式默认 verbose_json
+        if response_format_str not in _RESPONSE_FORMATTERS:
+            response_format_str = AudioResponseFormat.VERBOSE_JSON
+        return _format_response(result, response_format_str)
     except Exception as e:
         logger.error(f"Failed to transcribe from URL: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to transcribe from URL: {str(e)}")
@@ -0,0 +1,16 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class OrjsonResponse(JSONResponse):
+    """
+    使用 orjson 序列化的 JSON 响应。
+
+    FastAPI 已弃用内置的 ORJSONResponse，这里直接继承 JSONResponse 并只替换 render，
+    序列化前的 jsonable_encoder 等处理仍走 FastAPI 的标准路径。
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
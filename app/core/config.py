@@ -6,6 +6,10 @@ class Settings(BaseSettings):
     # API服务器配置
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
+    # 调试模式：开启额外的运行时断言
+    DEBUG: bool = False
+    # 日志级别：DEBUG | INFO | WARNING | ERROR
+    LOG_LEVEL: str = "INFO"
 
     # 简单的 API 密钥
     API_KEY: str = "your-secret-api-key"
@@ -22,9 +26,74 @@ class Settings(BaseSettings):
     # 说话人识别模型配置
     SPK_MODEL_ID: str = "iic/speech_campplus_sv_zh-cn_16k-common"
     
+    # 识别后端：funasr（ModelScope pipeline）| faster_whisper（CTranslate2，需额外安装 faster-whisper）
+    # | onnx_int8（ONNX Runtime int8 量化，仅 CPU，需额外安装 funasr-onnx）
+    ASR_BACKEND: str = "funasr"
+
+    # faster-whisper 后端的模型与计算精度
+    FASTER_WHISPER_MODEL: str = "medium"
+    FASTER_WHISPER_COMPUTE_TYPE: str = "int8_float16"
+
+    # 启用的子模型（逗号分隔）：vad,punc,spk；去掉不需要的阶段可缩短加载与推理时间
+    ASR_SUBMODELS: str = "vad,punc,spk"
+
+    # 标点模型每次处理的 token 数；CT-Transformer 按此长度分段循环推理，避免长文本的注意力开销平方增长
+    PUNC_SPLIT_SIZE: int = 20
+
+    # 仅 onnx_int8 后端生效的提前退出阈值：VAD 语音总时长不足 ONNX_MIN_VOICED_MS（毫秒）时跳过识别，
+    # 识别文本不足 ONNX_PUNC_MIN_CHARS 个字符时跳过标点；funasr 后端没有对应的判断，短音频照常完整识别
+    ONNX_MIN_VOICED_MS: int = 200
+    ONNX_PUNC_MIN_CHARS: int = 4
+
     # 模型下载缓存目录
     MODEL_CACHE_DIR: str = "./model_cache"
 
+    # 临时音频与分块文件目录，留空则使用系统临时目录；可设为 /dev/shm 等内存文件系统以省去磁盘读写
+    TEMP_DIR: str = ""
+
+    # 推理精度：fp32 | fp16 | bf16（仅 GPU）| int8（动态量化，仅 CPU）
+    ASR_PRECISION: str = "fp32"
+
+    # 是否用 torch.compile 编译 ASR 模型（首次启动会更慢），以及编译模式
+    ASR_TORCH_COMPILE: bool = False
+    ASR_COMPILE_MODE: str = "reduce-overhead"
+
+    # 是否用 TorchScript 脚本化并 optimize_for_inference 各模型的 encoder（与 ASR_TORCH_COMPILE 二选一），
+    # 脚本化结果缓存在 MODEL_CACHE_DIR/torchscript 下
+    ASR_TORCHSCRIPT: bool = False
+
+    # 推理使用的 CPU 线程数，0 表示使用默认值（FunASR 默认 4）；多 worker 部署时应按核数均分
+    ASR_CPU_THREADS: int = 0
+
+    # 启动时用合成音频预热一次 pipeline，把 CUDA 上下文、kernel 加载等首次开销挪到启动阶段
+    ASR_WARMUP: bool = True
+    # 是否开启 cudnn.benchmark；输入长度多变时每种新形状都会重新选算法，默认关闭
+    ASR_CUDNN_BENCHMARK: bool = False
+
+    # 单个 ASR 批次内 VAD 语音段的总时长上限（秒）
+    ASR_BATCH_SIZE_S: int = 300
+
+    # 请求合并批处理：单批最大请求数与最长等待时间（毫秒）；
+    # 仅在 funasr 后端关闭 VAD（ASR_SUBMODELS 不含 vad）时生效，其余情况下请求逐个执行
+    ASR_BATCH_MAX_SIZE: int = 8
+    ASR_BATCH_MAX_WAIT_MS: int = 20
+
+    # 分块上传：内存中累积多少字节后再写入磁盘
+    CHUNK_FLUSH_THRESHOLD: int = 4 * 1024 * 1024
+    # 合并分块时并发拷贝的文件数
+    CHUNK_MERGE_CONCURRENCY: int = 8
+    # 所有上传在内存中缓冲的总字节数上限，超出时先落盘最久未活动的上传
+    CHUNK_MAX_BUFFERED_BYTES: int = 256 * 1024 * 1024
+    # 上传闲置多少秒后落盘剩余分块并释放其内存状态，0 表示不清理
+    CHUNK_IDLE_TTL: int = 600
+
+    # 按音频内容摘要缓存的识别结果条数，0 表示不缓存
+    RESULT_CACHE_SIZE: int = 1024
+
+    # 从 URL 拉取音频：超时时间（秒）与连接池大小
+    URL_FETCH_TIMEOUT: float = 60.0
+    URL_FETCH_MAX_CONNECTIONS: int = 64
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
@@ -32,5 +101,10 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
+# 每个请求都会用到的配置项，启动时从 settings 读取一次并缓存为模块级常量
+API_KEY_BYTES: bytes = settings.API_KEY.encode()
+
 # 确保模型缓存目录存在
-os.makedirs(settings.MODEL_CACHE_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(settings.MODEL_CACHE_DIR, exist_ok=True)
+if settings.TEMP_DIR:
+    os.makedirs(settings.TEMP_DIR, exist_ok=True)
\ No newline at end of file
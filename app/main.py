@@ -1,30 +1,69 @@
+import logging
+import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.api.responses import OrjsonResponse
 from app.core.config import settings
 from app.services.asr_service import initialize_asr_service
+from app.services.batcher import initialize_transcription_batcher, shutdown_transcription_batcher
+from app.services.chunk_store import initialize_chunk_store, shutdown_chunk_store
+from app.services.result_cache import initialize_transcription_cache
+from app.services.http_client import initialize_http_client, shutdown_http_client
 from app.api.endpoints import audio
 
+# uvicorn 只配置自身的 uvicorn.* logger，应用日志需在这里配置根 logger 才会输出
+logging.basicConfig(
+    level=settings.LOG_LEVEL.upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
+logger = logging.getLogger(__name__)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- 应用启动时执行 ---
-    print("Application startup...")
+    logger.info("Application startup...")
     # 初始化 ASR 服务并将其存储在 app.state 中
-    print(f"Loading ASR models: ASR={settings.FUNASR_MODEL_ID}, VAD={settings.VAD_MODEL_ID}, PUNC={settings.PUNC_MODEL_ID}, SPK={settings.SPK_MODEL_ID}")
+    logger.info(f"Loading ASR models: ASR={settings.FUNASR_MODEL_ID}, VAD={settings.VAD_MODEL_ID}, PUNC={settings.PUNC_MODEL_ID}, SPK={settings.SPK_MODEL_ID}")
     app.state.asr_service = initialize_asr_service()
-    print("Complete ASR pipeline has been initialized.")
+    logger.info("Complete ASR pipeline has been initialized.")
+    # 启动请求合并批处理器，所有识别请求都经由它调用模型
+    # 接口直接引用这些模块级单例，无需每个请求经由 app.state 查找
+    initialize_transcription_batcher(
+        app.state.asr_service,
+        max_batch_size=settings.ASR_BATCH_MAX_SIZE,
+        max_wait_ms=settings.ASR_BATCH_MAX_WAIT_MS,
+    )
+    initialize_chunk_store(
+        root_dir=os.path.join(settings.TEMP_DIR, "chunks") if settings.TEMP_DIR else None,
+        flush_threshold=settings.CHUNK_FLUSH_THRESHOLD,
+        max_buffered_bytes=settings.CHUNK_MAX_BUFFERED_BYTES,
+        idle_ttl=settings.CHUNK_IDLE_TTL,
+    )
+    initialize_transcription_cache(maxsize=settings.RESULT_CACHE_SIZE)
+    initialize_http_client(
+        timeout=settings.URL_FETCH_TIMEOUT,
+        max_connections=settings.URL_FETCH_MAX_CONNECTIONS,
+    )
 
     yield
 
-    print("Application shutdown...")
+    logger.info("Application shutdown...")
+    await shutdown_transcription_batcher()
+    # 把仍在内存中的分块落盘，重启后可从 manifest 继续接收
+    await shutdown_chunk_store()
+    await shutdown_http_client()
+    app.state.asr_service.close()
     app.state.asr_service = None
-    print("ASR Service has been shut down.")
+    logger.info("ASR Service has been shut down.")
 
 
 app = FastAPI(
     title="FunASR OpenAI-Compatible API",
     description="An API for FunASR that mimics the OpenAI audio transcription API.",
     version="1.0.0",
+    default_response_class=OrjsonResponse,
     lifespan=lifespan
 )
 
@@ -0,0 +1,115 @@
+import os
+from typing import Any, Dict, List, Optional
+
+import logging
+
+from app.services.audio_io import SAMPLE_RATE, load_audio
+
+logger = logging.getLogger(__name__)
+
+
+class FasterWhisperBackend:
+    """
+    基于 CTranslate2 的 faster-whisper 识别后端。
+
+    调用方式与 ModelScope pipeline 相同：接受单个或一组音频输入，返回与输入一一对应的结果列表。
+    结果沿用 FunASR 的结构（text + sentence_info，时间单位为毫秒），formatters 无需改动。
+    """
+
+    def __init__(self, model_size_or_path: str, device: str = "cpu", compute_type: str = "default",
+                 download_root: Optional[str] = None, cpu_threads: int = 0):
+        # 可选依赖，仅在 ASR_BACKEND=faster_whisper 时需要安装
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(
+            model_size_or_path,
+            device=device,
+            compute_type=compute_type,
+            download_root=download_root,
+            cpu_threads=cpu_threads,
+        )
+
+    def __call__(self, input, hotword: str = None, **kwargs) -> List[Dict[str, Any]]:
+        inputs = input if isinstance(input, (list, tuple)) else [input]
+        return [self._transcribe_one(audio, hotword) for audio in inputs]
+
+    def _transcribe_one(self, audio, hotword: Optional[str]) -> Dict[str, Any]:
+        segments, info = self.model.transcribe(audio, hotwords=hotword or None, vad_filter=True)
+        sentence_info = [
+            {"text": segment.text, "start": int(segment.start * 1000), "end": int(segment.end * 1000)}
+            for segment in segments
+        ]
+        key = os.path.splitext(os.path.basename(audio))[0] if isinstance(audio, str) else "audio"
+        return {
+            "key": key,
+            # Whisper 的分段文本自带前导空格（英文）或无需分隔（中文），直接拼接即可
+            "text": "".join([sentence["text"] for sentence in sentence_info if sentence["text"]]).strip(),
+            "sentence_info": sentence_info,
+            "language": info.language,
+        }
+
+
+class OnnxAsrBackend:
+    """
+    基于 ONNX Runtime（funasr-onnx）的 int8 量化识别后端，面向纯 CPU 部署。
+
+    依次执行 VAD 切分、逐段 Paraformer 识别与逐段标点，结果结构与 FunASR pipeline 相同。
+    模型目录中缺少 model_quant.onnx 时 funasr-onnx 会在首次加载时自动导出，
+    也可以提前运行 scripts/export_asr_onnx.py 离线导出。
+    """
+
+    def __init__(self, model_dir: str, vad_model_dir: Optional[str] = None, punc_model_dir: Optional[str] = None,
+                 cache_dir: Optional[str] = None, intra_op_num_threads: int = 4, punc_split_size: int = 20,
+                 min_voiced_ms: int = 0, punc_min_chars: int = 0):
+        # 可选依赖，仅在 ASR_BACKEND=onnx_int8 时需要安装
+        from funasr_onnx import CT_Transformer, Fsmn_vad, Paraformer
+
+        onnx_kwargs = {"quantize": True, "intra_op_num_threads": intra_op_num_threads, "cache_dir": cache_dir}
+        self.model = Paraformer(model_dir, batch_size=1, **onnx_kwargs)
+        self.vad_model = Fsmn_vad(vad_model_dir, **onnx_kwargs) if vad_model_dir else None
+        self.punc_model = CT_Transformer(punc_model_dir, **onnx_kwargs) if punc_model_dir else None
+        self.punc_split_size = punc_split_size
+        self.min_voiced_ms = min_voiced_ms
+        self.punc_min_chars = punc_min_chars
+
+    def __call__(self, input, hotword: str = None, **kwargs) -> List[Dict[str, Any]]:
+        inputs = input if isinstance(input, (list, tuple)) else [input]
+        if hotword:
+            logger.debug("Hotwords are not supported by the ONNX Paraformer backend, ignoring")
+        return [self._transcribe_one(audio) for audio in inputs]
+
+    def _transcribe_one(self, audio) -> Dict[str, Any]:
+        key = "audio"
+        if isinstance(audio, str):
+            key = os.path.splitext(os.path.basename(audio))[0]
+            path, audio = audio, load_audio(audio)
+            if audio is None:
+                raise ValueError(f"Unsupported audio format for the ONNX backend: {path}")
+
+        if self.vad_model is not None:
+            segments = self.vad_model(audio)[0]
+        else:
+            segments = [[0, len(audio) * 1000 // SAMPLE_RATE]]
+
+        # 静音或几乎无人声的音频直接返回空结果，只承担 VAD 的开销
+        sentence_info = []
+        if sum([end - start for start, end in segments]) < self.min_voiced_ms:
+            return {"key": key, "text": "", "sentence_info": sentence_info}
+
+        for start, end in segments:
+            waveform = audio[start * SAMPLE_RATE // 1000:end * SAMPLE_RATE // 1000]
+            if not len(waveform):
+                continue
+            preds = self.model(waveform)[0]["preds"]
+            # 不同版本的 funasr-onnx 返回字符串或 (text, tokens)
+            text = preds if isinstance(preds, str) else preds[0]
+            if self.punc_model is not None and len(text.strip()) >= max(1, self.punc_min_chars):
+                text = self.punc_model(text, split_size=self.punc_split_size)[0]
+            if text:
+                sentence_info.append({"text": text, "start": start, "end": end})
+
+        return {
+            "key": key,
+            "text": "".join([sentence["text"] for sentence in sentence_info]),
+            "sentence_info": sentence_info,
+        }
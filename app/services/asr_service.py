@@ -1,10 +1,17 @@
+import numpy as np
 import torch
+from modelscope.hub.snapshot_download import snapshot_download
 from modelscope.pipelines import pipeline
 from modelscope.utils.constant import Tasks
 from app.core.config import settings
+from app.services.asr_backend import FasterWhisperBackend, OnnxAsrBackend
+import contextlib
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List, Union
 
 logger = logging.getLogger(__name__)
 
@@ -13,55 +20,402 @@ class ASRService:
     def __init__(self, model_revision: str = "master"):
         """
         初始化并加载完整的语音识别pipeline，包括VAD、ASR、PUNC、SPK模型。
+        ASR_BACKEND=faster_whisper 时改用 faster-whisper 后端，对外接口保持不变。
         """
         # 确定设备 (GPU or CPU)
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"ASR Service: Initializing models on device: {self.device}")
+        self.backend = settings.ASR_BACKEND.lower()
+
+        # 每次调用 pipeline 时附带的额外参数
+        self.call_kwargs: Dict[str, Any] = {}
+        # torch.compile/TorchScript 的预热成功后无需再次预热
+        self.warmed_up = False
+
+        # 所有推理都在这个常驻的单线程中执行；模型加载与预热也放在这里，
+        # 使 CPU 线程数、CUDA 上下文、cudagraph 等线程相关状态在处理请求的线程上就已就绪
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr-inference")
+        try:
+            self.executor.submit(self._load_models, model_revision).result()
+        except BaseException:
+            self.executor.shutdown(wait=False)
+            raise
+
+    def _load_models(self, model_revision: str):
+        """加载所选后端的模型并预热，须在推理线程中调用"""
+        if self.device == "cuda" and settings.ASR_CUDNN_BENCHMARK:
+            torch.backends.cudnn.benchmark = True
+        self._configure_cpu_threads()
+
+        if self.backend == "funasr":
+            self._init_asr_pipeline(model_revision)
+        elif self.backend == "faster_whisper":
+            self.precision = settings.FASTER_WHISPER_COMPUTE_TYPE
+            logger.info(f"Initializing faster-whisper on device: {self.device}, compute type: {self.precision}")
+            self.asr_pipeline = FasterWhisperBackend(
+                settings.FASTER_WHISPER_MODEL,
+                device=self.device,
+                compute_type=self.precision,
+                download_root=settings.MODEL_CACHE_DIR,
+                cpu_threads=settings.ASR_CPU_THREADS,
+            )
+        elif self.backend == "onnx_int8":
+            self._init_onnx_backend()
+        else:
+            raise ValueError(f"Unsupported ASR_BACKEND: {settings.ASR_BACKEND}")
+
+        if settings.ASR_WARMUP and not self.warmed_up:
+            self._warmup()
+        logger.info("All ASR models loaded successfully.")
+
+    def close(self):
+        """关闭推理线程，正在执行的调用会先完成"""
+        self.executor.shutdown(wait=False)
+
+    def _init_asr_pipeline(self, model_revision: str):
+        """加载 FunASR（ModelScope）pipeline，并按配置转换精度、编译模型"""
+        self.precision = self._resolve_precision(settings.ASR_PRECISION)
+        logger.info(f"Initializing models on device: {self.device}, precision: {self.precision}")
+
+        # fp16/bf16 由 FunASR 在加载时直接转换主模型权重
+        precision_kwargs = {self.precision: True} if self.precision in ("fp16", "bf16") else {}
+
+        # 只加载启用的子模型，未启用的阶段在 pipeline 中直接跳过
+        self.submodels = self._resolve_submodels(settings.ASR_SUBMODELS)
+        submodel_ids = {"vad": settings.VAD_MODEL_ID, "punc": settings.PUNC_MODEL_ID, "spk": settings.SPK_MODEL_ID}
+        submodel_kwargs = {f"{name}_model": submodel_ids[name] for name in self.submodels}
+        if "punc" in self.submodels:
+            submodel_kwargs["punc_kwargs"] = {"split_size": settings.PUNC_SPLIT_SIZE}
+        # FunASR 加载时会按 ncpu（默认 4）调用 torch.set_num_threads，需显式传入才不会被覆盖
+        if settings.ASR_CPU_THREADS > 0:
+            submodel_kwargs["ncpu"] = settings.ASR_CPU_THREADS
+        logger.info(f"Enabled sub-models: {', '.join(sorted(self.submodels)) or 'none'}")
+        # 主模型传入 MODEL_CACHE_DIR 中的本地快照目录；预取失败时回退为模型 ID，由 pipeline 自行下载
+        self.model_dir = self._prefetch_models(model_revision, [submodel_ids[name] for name in self.submodels])
 
         self.asr_pipeline = pipeline(
             task=Tasks.auto_speech_recognition,
-            model=settings.FUNASR_MODEL_ID,
+            model=self.model_dir or settings.FUNASR_MODEL_ID,
             model_revision=model_revision,
             cache_dir=settings.MODEL_CACHE_DIR,
-            vad_model=settings.VAD_MODEL_ID,
-            punc_model=settings.PUNC_MODEL_ID,
-            spk_model=settings.SPK_MODEL_ID,
-            device=self.device
+            device=self.device,
+            **submodel_kwargs,
+            **precision_kwargs
         )
-        print("ASR Service: All models loaded successfully.")
-    
+        # FunASR 会把单个输入中 VAD 切出的语音段按时长排序后拼成批次送入 ASR 模型（不跨请求合批），
+        # batch_size_s 为单批语音段的总时长上限（秒），越大并行度越高、显存占用也越大
+        self.call_kwargs["batch_size_s"] = settings.ASR_BATCH_SIZE_S
+
+        if self.precision == "int8":
+            self._quantize_int8()
+        if settings.ASR_TORCH_COMPILE:
+            self._compile_model()
+        elif settings.ASR_TORCHSCRIPT:
+            self._script_model()
+
+    def _configure_cpu_threads(self):
+        """按 ASR_CPU_THREADS 设置算子内线程数，并关闭算子间并行以免与请求线程争抢 CPU"""
+        if settings.ASR_CPU_THREADS > 0:
+            torch.set_num_threads(settings.ASR_CPU_THREADS)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # 只能在首次执行并行任务前设置，重复初始化时忽略
+            pass
+
+    def _init_onnx_backend(self):
+        """加载 ONNX Runtime int8 后端，VAD 与标点按 ASR_SUBMODELS 启用（不支持说话人识别）"""
+        self.precision = "int8"
+        self.submodels = self._resolve_submodels(settings.ASR_SUBMODELS)
+        if "spk" in self.submodels:
+            logger.warning("Speaker recognition is not available with ASR_BACKEND=onnx_int8, disabling spk")
+            self.submodels.discard("spk")
+        logger.info(f"Initializing ONNX Runtime int8 backend, enabled sub-models: {', '.join(sorted(self.submodels)) or 'none'}")
+        self.asr_pipeline = OnnxAsrBackend(
+            settings.FUNASR_MODEL_ID,
+            vad_model_dir=settings.VAD_MODEL_ID if "vad" in self.submodels else None,
+            punc_model_dir=settings.PUNC_MODEL_ID if "punc" in self.submodels else None,
+            cache_dir=settings.MODEL_CACHE_DIR,
+            intra_op_num_threads=settings.ASR_CPU_THREADS or 4,
+            punc_split_size=settings.PUNC_SPLIT_SIZE,
+            min_voiced_ms=settings.ONNX_MIN_VOICED_MS,
+            punc_min_chars=settings.ONNX_PUNC_MIN_CHARS,
+        )
+
+    def _prefetch_models(self, model_revision: str, submodel_ids: List[str]) -> Optional[str]:
+        """
+        并发下载（或校验本地缓存）主模型与各子模型的快照。
+
+        主模型按 model_revision 下载到 MODEL_CACHE_DIR，并把返回的本地目录直接交给 pipeline 加载；
+        子模型与 FunASR 自身的获取方式一致（默认缓存目录、master 版本），其内部获取随后直接命中缓存。
+        失败时仅记录日志，交由 pipeline 重试。
+
+        Returns:
+            str: 主模型的本地快照目录，下载失败时为 None
+        """
+        downloads = [((settings.FUNASR_MODEL_ID,), {"revision": model_revision, "cache_dir": settings.MODEL_CACHE_DIR})]
+        downloads += [((model_id,), {"revision": "master"}) for model_id in submodel_ids]
+        with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+            futures = [(executor.submit(snapshot_download, *args, **kwargs), args[0]) for args, kwargs in downloads]
+            local_dirs = []
+            for future, model_id in futures:
+                try:
+                    local_dirs.append(future.result())
+                except Exception as e:
+                    logger.warning(f"Prefetching {model_id} failed: {str(e)}")
+                    local_dirs.append(None)
+        return local_dirs[0]
+
+    def _resolve_submodels(self, submodels: str) -> set:
+        """解析 ASR_SUBMODELS（逗号分隔），说话人识别依赖 VAD 与标点的句子切分"""
+        enabled = {name.strip().lower() for name in submodels.split(",") if name.strip()}
+        unknown = enabled - {"vad", "punc", "spk"}
+        if unknown:
+            raise ValueError(f"Unsupported ASR_SUBMODELS entries: {', '.join(sorted(unknown))}")
+        if "spk" in enabled and not {"vad", "punc"} <= enabled:
+            logger.warning("Speaker recognition requires both vad and punc sub-models, disabling spk")
+            enabled.discard("spk")
+        return enabled
+
+    def _resolve_precision(self, precision: str) -> str:
+        """校验配置的推理精度，并回退当前设备不支持的取值"""
+        precision = precision.lower()
+        if precision not in ("fp32", "fp16", "bf16", "int8"):
+            raise ValueError(f"Unsupported ASR_PRECISION: {precision}")
+        if precision in ("fp16", "bf16") and self.device != "cuda":
+            logger.warning(f"ASR_PRECISION={precision} requires CUDA, falling back to fp32")
+            return "fp32"
+        if precision == "int8" and self.device != "cpu":
+            logger.warning("ASR_PRECISION=int8 (dynamic quantization) only runs on CPU, falling back to fp32")
+            return "fp32"
+        return precision
+
+    def _compile_model(self):
+        """
+        用 torch.compile 编译 ASR 主模型的 encoder/decoder 以及 VAD、标点模型的 encoder，并在启动时完成预热编译。
+
+        FunASR 通过 model.inference() 而非 forward 调用各模型，因此只能编译其内部
+        forward 会被直接调用的子模块。VAD 模型很小、每次调用启动大量细碎 kernel，
+        reduce-overhead 模式下的 CUDA Graph 对其收益最明显。编译或预热失败时恢复为未编译的模块。
+        """
+        if not hasattr(torch, "compile"):
+            logger.warning("torch.compile requires PyTorch 2.x, skipping ASR_TORCH_COMPILE")
+            return
+
+        auto_model = self.asr_pipeline.model.model
+        targets = {"model": ("encoder", "decoder"), "vad_model": ("encoder",), "punc_model": ("encoder",)}
+        originals = {}
+        for model_name, submodule_names in targets.items():
+            model = getattr(auto_model, model_name, None)
+            for name in submodule_names:
+                module = getattr(model, name, None)
+                if isinstance(module, torch.nn.Module):
+                    originals[(model, name)] = module
+                    setattr(model, name, torch.compile(module, mode=settings.ASR_COMPILE_MODE))
+
+        # torch.compile 是惰性的，首次调用时才真正编译，放在启动阶段避免首个请求承担编译耗时
+        if originals and not self._warmup():
+            logger.warning("torch.compile warmup failed, falling back to eager modules")
+            for (model, name), module in originals.items():
+                setattr(model, name, module)
+
+    def _script_model(self):
+        """
+        用 TorchScript 脚本化 ASR、VAD、标点模型的 encoder 并 optimize_for_inference。
+
+        与 torch.compile 相同，只能替换 forward 会被直接调用的子模块；无法脚本化的模块保持原样。
+        脚本化结果按模型 ID、权重文件指纹、精度与 torch 版本缓存，下次启动直接加载。
+        """
+        auto_model = self.asr_pipeline.model.model
+        model_ids = {"model": settings.FUNASR_MODEL_ID, "vad_model": settings.VAD_MODEL_ID, "punc_model": settings.PUNC_MODEL_ID}
+        # AutoModel 为各模型保存的构建参数，其中 init_param 为实际加载的权重文件
+        model_kwargs = {"model": "kwargs", "vad_model": "vad_kwargs", "punc_model": "punc_kwargs"}
+        cache_dir = os.path.join(settings.MODEL_CACHE_DIR, "torchscript")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        originals = {}
+        for name, model_id in model_ids.items():
+            model = getattr(auto_model, name, None)
+            module = getattr(model, "encoder", None)
+            if not isinstance(module, torch.nn.Module):
+                continue
+            weights = self._weights_fingerprint(getattr(auto_model, model_kwargs[name], None) or {})
+            if weights is None:
+                # 无法确认权重版本时不使用缓存，以免加载到旧权重脚本化的模块
+                continue
+            cache_key = f"{model_id}_{weights}_{self.precision}_torch{torch.__version__}".replace("/", "--").replace("+", "-")
+            cache_path = os.path.join(cache_dir, f"{cache_key}.encoder.pt")
+            try:
+                if os.path.exists(cache_path):
+                    # 显式 map_location 并 .to(device)，避免加载后模块留在 CPU 上
+                    scripted = torch.jit.load(cache_path, map_location=self.device).to(self.device)
+                else:
+                    scripted = torch.jit.optimize_for_inference(torch.jit.script(module.eval()))
+                    torch.jit.save(scripted, cache_path)
+            except Exception as e:
+                logger.warning(f"TorchScript of {name}.encoder failed, keeping eager module: {str(e)}")
+                continue
+            originals[(name, cache_path)] = module
+            model.encoder = scripted
+
+        if originals and not self._warmup():
+            logger.warning("TorchScript warmup failed, falling back to eager modules")
+            for (name, cache_path), module in originals.items():
+                getattr(auto_model, name).encoder = module
+                # 缓存的脚本模块不可用，删除以免下次启动再次加载
+                if os.path.exists(cache_path):
+                    os.remove(cache_path)
 
-    def transcribe(self, audio_file_path: str, hotword: str = None) -> Dict[str, Any]:
+    @staticmethod
+    def _weights_fingerprint(model_kwargs: Dict[str, Any]) -> Optional[str]:
         """
-        对给定的音频文件执行完整的语音识别pipeline。
+        根据权重文件的路径、大小与修改时间生成指纹。
+
+        模型更新到新的快照版本时权重文件会被重新下载，指纹随之变化，旧的脚本化缓存不再命中。
+        不读取文件内容，避免启动时对数百 MB 的权重做完整哈希。
+        """
+        weights_path = model_kwargs.get("init_param")
+        if not weights_path or not os.path.isfile(weights_path):
+            return None
+        stat = os.stat(weights_path)
+        identity = f"{os.path.realpath(weights_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        return hashlib.sha256(identity.encode()).hexdigest()[:16]
+
+    def _inference_context(self):
+        """
+        pipeline 调用所需的上下文：始终开启 inference_mode，fp16/bf16 时再开启 CUDA autocast。
+
+        权重已由 FunASR 在加载时转换，autocast 负责让中间计算（如特征、注意力）同样走低精度。
+        grad 模式是线程局部的，推理在工作线程中执行，因此须在每次调用时设置而非只在初始化时设置一次。
+        """
+        stack = contextlib.ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if self.backend == "funasr" and self.precision in ("fp16", "bf16"):
+            dtype = torch.float16 if self.precision == "fp16" else torch.bfloat16
+            stack.enter_context(torch.autocast("cuda", dtype=dtype))
+        return stack
+
+    def _warmup(self) -> bool:
+        """用一段 1 秒的合成音频跑一遍完整 pipeline，参数与真实请求一致"""
+        dummy = np.random.default_rng(0).standard_normal(16000).astype(np.float32) * 0.1
+        try:
+            with self._inference_context():
+                if self.backend == "funasr":
+                    # VAD 可能把噪声整段判为静音，完整 pipeline 便不会调用 ASR 主模型，
+                    # 编译/脚本化后的模块也就没有真正执行过；因此先绕过 VAD 直接对主模型推理一次
+                    auto_model = self.asr_pipeline.model.model
+                    if not auto_model.inference(dummy, model=auto_model.model, kwargs=auto_model.kwargs):
+                        raise RuntimeError("ASR model returned no result for the warmup input")
+                self.asr_pipeline(input=dummy, **self.call_kwargs)
+            # CUDA kernel 为异步执行，同步后才算真正完成预热
+            if self.device == "cuda":
+                torch.cuda.synchronize()
+            self.warmed_up = True
+            return True
+        except Exception as e:
+            logger.warning(f"ASR warmup failed: {str(e)}", exc_info=True)
+            return False
+
+    def _quantize_int8(self):
+        """
+        对 ASR 主模型及 VAD、标点模型的 Linear/LSTM 层做 int8 动态量化（仅 CPU）。
+
+        说话人模型以卷积为主，动态量化对其无效，因此保持 fp32。
+        """
+        # pipeline.model 为 ModelScope 对 FunASR AutoModel 的封装，AutoModel.model 等属性才是 nn.Module
+        auto_model = self.asr_pipeline.model.model
+        for name in ("model", "vad_model", "punc_model"):
+            module = getattr(auto_model, name, None)
+            if not isinstance(module, torch.nn.Module):
+                continue
+            try:
+                setattr(auto_model, name, torch.ao.quantization.quantize_dynamic(
+                    module, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8
+                ))
+            except Exception as e:
+                logger.warning(f"INT8 quantization of {name} failed, keeping fp32 weights: {str(e)}")
+                if name == "model":
+                    self.precision = "fp32"
+
+
+    def transcribe(self, audio: Union[str, np.ndarray], hotword: str = None) -> Dict[str, Any]:
+        """
+        对给定的音频执行完整的语音识别pipeline。
 
         Args:
-            audio_file_path (str): 音频文件的路径
+            audio (str | np.ndarray): 音频文件的路径，或已解码的 16kHz 单声道 float32 波形
             hotword (str, optional): 用于提高特定词汇识别准确率的热词
 
         Returns:
             dict: 包含完整处理结果的字典
         """
-        print(f"ASR Service: Processing audio file: {audio_file_path}")
-        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Processing audio: {audio if isinstance(audio, str) else f'{audio.shape[0]} samples'}")
+
         result = None
-        
+        start = time.perf_counter()
+
         try:
-            print("ASR Service: Running ASR...")
-            asr_result = self.asr_pipeline(
-                                            input=audio_file_path,
-                                            hotword=hotword
-                                        )
+            with self._inference_context():
+                asr_result = self.asr_pipeline(
+                                                input=audio,
+                                                hotword=hotword,
+                                                **self.call_kwargs
+                                            )
+            logger.info(f"ASR pipeline finished in {(time.perf_counter() - start) * 1000:.1f}ms")
             if not asr_result:
                 return result
-            print("ASR Service: Complete pipeline processing finished.")
-            print("Complete asr_result:", asr_result)
+            # 部分 FunASR 版本对单个输入直接返回 dict 而非列表
+            if isinstance(asr_result, dict):
+                return asr_result
             return asr_result[0]
 
         except Exception as e:
             logger.error(f"Pipeline processing error: {str(e)}", exc_info=True)
             return None
-    
+
+    @property
+    def supports_batching(self) -> bool:
+        """
+        多个输入能否在一次前向中真正合批。
+
+        FunASR 开启 VAD 时 inference_with_vad 对列表输入仍逐个解码；只有关闭 VAD 并显式传入
+        batch_size 时，inference 才会把多个输入补齐到同一长度后一次前向。其余后端均逐个处理。
+        """
+        return self.backend == "funasr" and "vad" not in self.submodels
+
+    def transcribe_batch(self, audios: List[Union[str, np.ndarray]], hotword: str = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        在一次 pipeline 调用中识别多个音频，仅在 supports_batching 为 True 时有意义。
+
+        Args:
+            audios (list): 音频文件路径或已解码波形的列表
+            hotword (str, optional): 作用于整个批次的热词
+
+        Returns:
+            list: 与输入一一对应的识别结果，失败的项为 None
+        """
+        if len(audios) == 1:
+            return [self.transcribe(audios[0], hotword=hotword)]
+
+        start = time.perf_counter()
+        try:
+            with self._inference_context():
+                asr_result = self.asr_pipeline(
+                                                input=audios,
+                                                hotword=hotword,
+                                                batch_size=len(audios),
+                                                **self.call_kwargs
+                                            )
+            logger.info(f"ASR pipeline finished batch of {len(audios)} in {(time.perf_counter() - start) * 1000:.1f}ms")
+        except Exception as e:
+            logger.error(f"Batched pipeline processing error: {str(e)}", exc_info=True)
+            asr_result = None
+
+        if not asr_result or isinstance(asr_result, dict) or len(asr_result) != len(audios):
+            # 批量调用失败或结果无法对齐时，逐个回退
+            return [self.transcribe(audio, hotword=hotword) for audio in audios]
+        return list(asr_result)
+
 
 # 在 main.py 中实例化
 asr_service_instance: ASRService = None
@@ -0,0 +1,52 @@
+import logging
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# FunASR 与 faster-whisper 模型均要求 16kHz 单声道输入
+SAMPLE_RATE = 16000
+
+# 解码结果有意保留为 CPU 上的 numpy 数组，而不是预先拷贝到 GPU（pinned memory + non_blocking）：
+# FunASR 的 fbank 前端与 faster-whisper 的特征提取都在 CPU 上对 numpy 波形计算，
+# 真正传到 GPU 的是体积更小的特征，由各自框架在模型内部完成拷贝。
+
+
+def load_audio(audio_file_path: str, sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
+    """
+    将音频文件一次性解码为单声道 float32 波形，必要时重采样到 sample_rate。
+
+    Args:
+        audio_file_path (str): 音频文件的路径
+        sample_rate (int): 目标采样率
+
+    Returns:
+        np.ndarray: 一维、C 连续的 float32 波形；soundfile 无法解码的格式（如 m4a、webm）返回 None，
+        由调用方回退为直接传入文件路径
+    """
+    try:
+        audio, sr = sf.read(audio_file_path, dtype="float32", always_2d=True)
+    except Exception as e:
+        logger.debug(f"soundfile cannot decode {audio_file_path}, falling back to path input: {str(e)}")
+        return None
+
+    # (frames, channels) -> 单声道；单声道时 audio[:, 0] 只是跨步视图，须复制为连续内存，
+    # 否则下游 torch.from_numpy 得到非连续张量，特征提取与卷积会先隐式拷贝一次
+    audio = audio.mean(axis=1) if audio.shape[1] > 1 else np.ascontiguousarray(audio[:, 0])
+
+    if sr != sample_rate:
+        try:
+            # torchaudio 为 FunASR 的依赖，仅在需要重采样时导入
+            import torch
+            import torchaudio.functional as F
+        except ImportError:
+            return None
+        audio = np.ascontiguousarray(F.resample(torch.from_numpy(audio), sr, sample_rate).numpy())
+
+    if settings.DEBUG:
+        assert audio.flags["C_CONTIGUOUS"] and audio.dtype == np.float32, "load_audio must return contiguous float32"
+    return audio
@@ -0,0 +1,192 @@
+import asyncio
+import functools
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from anyio import to_thread
+
+import numpy as np
+
+from app.services.asr_service import ASRService
+from app.services.audio_io import load_audio
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionBatcher:
+    """
+    串行执行识别请求；后端支持真正合批时（见 ASRService.supports_batching），
+    将短时间窗口内到达的请求合并为一次批量模型调用。
+
+    不支持合批时每个请求单独执行并在完成后立即返回，既不等待凑批，也不会被同组的长音频拖慢。
+
+    所有推理都由唯一的后台任务串行发起，并在 ASRService 的常驻推理线程（即加载与预热模型的线程）中执行，
+    因此同一时刻只有一个批次占用设备，且 CUDA/cuBLAS 句柄、cudagraph 等线程相关的状态在启动时就已就绪。
+    """
+
+    def __init__(self, asr_service: ASRService, max_batch_size: int = 8, max_wait_ms: int = 20):
+        self.asr_service = asr_service
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # 同时已解码（排队中或执行中）的请求数上限：解码后的 float32 波形每小时音频约 230MB，
+        # 不能让排队请求无限制地占用内存；保留至少 2 个名额，使下一个请求的解码与当前推理重叠
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def start(self):
+        """在当前事件循环中启动后台批处理任务"""
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max(2, self.max_batch_size))
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，并让仍在排队的请求失败返回"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while self._queue is not None and not self._queue.empty():
+            _, _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("Transcription batcher has been stopped"))
+
+    async def submit(self, audio_file_path: str, hotword: str = None) -> Optional[Dict[str, Any]]:
+        """
+        提交一个识别请求并等待其所在批次完成。
+
+        音频在入队前于线程池中解码，不占用串行的推理线程；已解码未完成的请求数受名额限制，
+        超出时后来的请求在解码前等待。
+
+        Args:
+            audio_file_path (str): 音频文件的路径
+            hotword (str, optional): 热词
+
+        Returns:
+            dict: 与 ASRService.transcribe 相同的识别结果
+        """
+        if self._worker is None:
+            raise RuntimeError("Transcription batcher not started. Call start() first.")
+        async with self._slots:
+            audio = await to_thread.run_sync(load_audio, audio_file_path)
+            fut = asyncio.get_running_loop().create_future()
+            await self._queue.put((audio_file_path if audio is None else audio, hotword, fut))
+            return await fut
+
+    async def _collect(self) -> List[Tuple[Union[str, np.ndarray], Optional[str], asyncio.Future]]:
+        """阻塞等待第一个请求，然后在 max_wait 内尽量凑满一个批次"""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.asr_service.supports_batching:
+                batch = await self._collect()
+            else:
+                batch = [await self._queue.get()]
+
+            # 热词作用于整个批次，因此按热词分组调用
+            groups: Dict[Optional[str], List[Tuple[Union[str, np.ndarray], asyncio.Future]]] = {}
+            for audio, hotword, fut in batch:
+                if not fut.cancelled():
+                    groups.setdefault(hotword, []).append((audio, fut))
+
+            sub_batches = [
+                (hotword, sub_batch)
+                for hotword, items in groups.items()
+                for sub_batch in _split_by_length(items)
+            ]
+            for hotword, items in sub_batches:
+                inputs = [audio for audio, _ in items]
+                try:
+                    results = await loop.run_in_executor(
+                        self.asr_service.executor,
+                        functools.partial(self.asr_service.transcribe_batch, inputs, hotword=hotword)
+                    )
+                except Exception as e:
+                    logger.error(f"Batched transcription failed: {str(e)}", exc_info=True)
+                    for _, fut in items:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+
+                for (_, fut), result in zip(items, results):
+                    if not fut.done():
+                        fut.set_result(result)
+
+
+def _split_by_length(items: List[Tuple[Union[str, np.ndarray], asyncio.Future]], max_ratio: float = 2.0):
+    """
+    按音频长度把一组请求切分为若干子批次，使子批次内最长音频不超过最短的 max_ratio 倍。
+
+    真正合批时所有输入都会补齐到批内最长的长度，长短悬殊的请求放在一起既浪费算力，
+    又让短音频等待长音频。未能预先解码的输入（文件路径）长度未知，单独成批。
+    """
+    decoded = sorted((item for item in items if not isinstance(item[0], str)), key=lambda item: len(item[0]))
+    batches = [[item] for item in items if isinstance(item[0], str)]
+    current: List[Tuple[np.ndarray, asyncio.Future]] = []
+    for item in decoded:
+        if current and len(item[0]) > max_ratio * max(1, len(current[0][0])):
+            batches.append(current)
+            current = []
+        current.append(item)
+    if current:
+        batches.append(current)
+    return batches
+
+
+# 在 main.py 的 lifespan 中初始化
+transcription_batcher_instance: TranscriptionBatcher = None
+
+
+def initialize_transcription_batcher(
+        asr_service: ASRService,
+        max_batch_size: int = 8,
+        max_wait_ms: int = 20
+) -> TranscriptionBatcher:
+    """
+    创建并启动批处理器单例，须在事件循环中调用
+
+    Returns:
+        TranscriptionBatcher: 已启动的批处理器实例
+    """
+    global transcription_batcher_instance
+    if transcription_batcher_instance is None:
+        transcription_batcher_instance = TranscriptionBatcher(asr_service, max_batch_size, max_wait_ms)
+        transcription_batcher_instance.start()
+    return transcription_batcher_instance
+
+
+async def shutdown_transcription_batcher():
+    """停止并释放批处理器单例"""
+    global transcription_batcher_instance
+    if transcription_batcher_instance is not None:
+        await transcription_batcher_instance.stop()
+        transcription_batcher_instance = None
+
+
+def get_transcription_batcher() -> TranscriptionBatcher:
+    """
+    获取批处理器实例
+
+    Raises:
+        RuntimeError: 如果批处理器未初始化
+    """
+    if transcription_batcher_instance is None:
+        raise RuntimeError("Transcription batcher not initialized. Call initialize_transcription_batcher() first.")
+    return transcription_batcher_instance
@@ -0,0 +1,495 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import anyio
+from anyio import to_thread
+
+logger = logging.getLogger(__name__)
+
+# 拷贝文件时每次处理的字节数
+COPY_BUFFER_SIZE = 1 << 20
+
+# 按落盘顺序记录分块文件序号范围（"起始 结束"，结束不含）的清单文件
+MANIFEST_NAME = "manifest"
+
+
+class _PendingRun:
+    """某个上传中尚未落盘、序号连续的一段分块"""
+
+    __slots__ = ("start", "offsets", "buffer")
+
+    def __init__(self, start: int):
+        self.start = start
+        # offsets[i] 为第 start + i 个分块在 buffer 中的起始位置
+        self.offsets: List[int] = []
+        self.buffer = bytearray()
+
+    @property
+    def next_index(self) -> int:
+        return self.start + len(self.offsets)
+
+    def append(self, chunk_index: int, parts: List[bytes]):
+        """追加一个分块（由若干片段组成），各片段直接拷入 buffer，不先拼接"""
+        if chunk_index < self.next_index:
+            # 重传：原位替换该分块的数据
+            data = b"".join(parts)
+            pos = chunk_index - self.start
+            begin = self.offsets[pos]
+            end = self.offsets[pos + 1] if pos + 1 < len(self.offsets) else len(self.buffer)
+            self.buffer[begin:end] = data
+            delta = len(data) - (end - begin)
+            for k in range(pos + 1, len(self.offsets)):
+                self.offsets[k] += delta
+            return
+        self.offsets.append(len(self.buffer))
+        for part in parts:
+            self.buffer += part
+
+
+class _UploadState:
+    """单个上传（以 fileMd5 标识）的进程内状态"""
+
+    __slots__ = ("pending", "flushed", "files", "total", "hasher", "hashed_next", "dir_ready", "last_active")
+
+    def __init__(self):
+        self.pending: Optional[_PendingRun] = None
+        # 分块目录是否已创建，避免每次落盘都调用 os.makedirs
+        self.dir_ready = False
+        # 已经落盘或正在落盘的分块序号；在 await 写盘之前就登记，
+        # 保证写盘期间到达的重传不会再次进入内存缓冲而被重复写入
+        self.flushed: Set[int] = set()
+        # 已落盘分块文件的起始序号，按写入顺序排列
+        self.files: List[int] = []
+        self.total: Optional[int] = None
+        # 按序到达的分块增量计算内容摘要；出现乱序或已计入的分块被重新缓冲时置为 None
+        self.hasher = hashlib.sha256()
+        self.hashed_next = 0
+        # 最近一次收到分块的时间（time.monotonic），用于清理闲置的上传
+        self.last_active = time.monotonic()
+
+    def commit(self, run: "_PendingRun") -> "_PendingRun":
+        """登记一段即将写盘的分块，须在 await 写盘之前调用"""
+        self.flushed.update(range(run.start, run.next_index))
+        return run
+
+    def accepts_hash(self, chunk_index: int) -> bool:
+        """判断该分块能否按顺序计入内容摘要"""
+        if self.hasher is not None and chunk_index != self.hashed_next:
+            # 乱序到达，或已计入摘要的分块被重传并重新缓冲（内容可能不同），摘要不再可信
+            self.hasher = None
+        return self.hasher is not None and chunk_index == self.hashed_next
+
+
+class ChunkStore:
+    """
+    分块上传的临时存储。
+
+    序号连续的分块先在内存中累积，累计达到 flush_threshold 字节或收到最后一块时才作为
+    一个文件写入磁盘，以减少大量小分块带来的文件创建与写入开销。落盘文件以其首个分块序号
+    命名（chunk_000123），按序号顺序拼接即可还原原始文件。每写入一个文件都会在同目录的
+    manifest 中追加其序号范围，合并时据此直接得到文件顺序，无需列目录并解析文件名。
+
+    状态保存在进程内，同一上传的所有分块需要由同一个进程处理。所有上传在内存中缓冲的
+    总字节数不超过 max_buffered_bytes，超出时先落盘最久未活动的上传；闲置超过 idle_ttl 秒的
+    上传由后台任务落盘并释放内存状态，之后再收到分块时从 manifest 恢复已落盘的范围。
+    """
+
+    def __init__(
+            self,
+            root_dir: str = None,
+            flush_threshold: int = 4 * 1024 * 1024,
+            max_buffered_bytes: int = 256 * 1024 * 1024,
+            idle_ttl: float = 600
+    ):
+        self.root_dir = root_dir or os.path.join(tempfile.gettempdir(), "chunks")
+        self.flush_threshold = flush_threshold
+        self.max_buffered_bytes = max_buffered_bytes
+        self.idle_ttl = idle_ttl
+        self._uploads: Dict[str, _UploadState] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def start(self):
+        """在当前事件循环中启动闲置上传的后台清理任务"""
+        if self.idle_ttl > 0:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        """停止后台清理任务，并把所有仍在内存中的分块落盘，避免已确认的分块随进程退出丢失"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        for file_md5 in list(self._uploads):
+            await self.flush(file_md5)
+
+    async def sweep(self):
+        """落盘并释放闲置超过 idle_ttl 的上传"""
+        deadline = time.monotonic() - self.idle_ttl
+        for file_md5, state in list(self._uploads.items()):
+            if state.last_active < deadline:
+                await self.flush(file_md5)
+                # 落盘期间可能又收到了新的分块
+                if state.last_active < deadline and state.pending is None:
+                    self.forget(file_md5)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_ttl / 2))
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.warning(f"Sweeping idle chunk uploads failed: {str(e)}", exc_info=True)
+
+    def chunk_dir(self, file_md5: str) -> str:
+        return os.path.join(self.root_dir, file_md5)
+
+    async def write_chunk(self, file_md5: str, chunk_index: int, total_chunks: int, data: bytes):
+        """
+        接收一个分块。
+
+        Args:
+            file_md5 (str): 上传标识
+            chunk_index (int): 分块序号，从 0 开始
+            total_chunks (int): 分块总数
+            data (bytes): 分块内容
+        """
+        await self._buffer_chunk(file_md5, chunk_index, total_chunks, [data])
+
+    async def _buffer_chunk(self, file_md5: str, chunk_index: int, total_chunks: int, parts: List[bytes]):
+        """将由若干片段组成的分块放入内存缓冲，必要时落盘"""
+        state = self._get_state(file_md5)
+        state.total = total_chunks
+        if chunk_index in state.flushed:
+            # 已落盘分块的重复提交，内容相同，直接忽略
+            return
+        if state.accepts_hash(chunk_index):
+            for part in parts:
+                state.hasher.update(part)
+            state.hashed_next += 1
+
+        # 先在同步代码中确定需要落盘的数据段，再统一 await 写盘，
+        # 避免同一上传的并发请求在写盘期间修改同一个缓冲区
+        to_flush = []
+        run = state.pending
+        if run is not None and not (run.start <= chunk_index <= run.next_index):
+            to_flush.append((file_md5, state, state.commit(run)))
+            run = None
+        if run is None:
+            run = state.pending = _PendingRun(chunk_index)
+        run.append(chunk_index, parts)
+
+        if len(run.buffer) >= self.flush_threshold or chunk_index == total_chunks - 1:
+            to_flush.append((file_md5, state, state.commit(run)))
+            state.pending = None
+
+        to_flush += self._over_budget_runs()
+        for md5, run_state, run in to_flush:
+            await self._write_run(md5, run_state, run)
+
+    async def write_chunk_stream(
+            self,
+            file_md5: str,
+            chunk_index: int,
+            total_chunks: int,
+            stream: AsyncIterator[bytes],
+            size_hint: Optional[int] = None
+    ) -> int:
+        """
+        以流的形式接收一个分块。
+
+        小于 flush_threshold 的分块照常进入内存缓冲；大小未知或较大的分块边读边写入
+        独立的文件，内存占用只有单个读取片段的大小。
+
+        Args:
+            file_md5 (str): 上传标识
+            chunk_index (int): 分块序号，从 0 开始
+            total_chunks (int): 分块总数
+            stream: 分块内容的异步字节流
+            size_hint (int, optional): 分块的预期字节数（如 Content-Length）
+
+        Returns:
+            int: 实际接收的字节数
+        """
+        if size_hint is not None and size_hint < self.flush_threshold:
+            # 先收齐各片段，再一次性追加进内存缓冲，期间只拷贝一次。
+            # 不使用预分配的复用缓冲区池：片段本身已由 ASGI 服务器分配，放进池化缓冲区只会多一次拷贝，
+            # 而数据最终都要进入各上传自己的待落盘数据段，池化缓冲区在写盘前无法归还
+            parts = []
+            received = 0
+            async for part in stream:
+                received += len(part)
+                if received > self.flush_threshold:
+                    raise ValueError("Chunk body is larger than its declared size")
+                parts.append(part)
+            await self._buffer_chunk(file_md5, chunk_index, total_chunks, parts)
+            return received
+
+        # 先落盘已累积的数据，保证该分块不会与内存中的数据段重叠
+        await self.flush(file_md5)
+        state = self._get_state(file_md5)
+        state.total = total_chunks
+
+        received = 0
+        run = state.pending
+        if chunk_index in state.flushed or (run is not None and run.start <= chunk_index < run.next_index):
+            # 重复提交（含 flush 期间由其他请求缓冲进内存的同一分块），内容相同，直接丢弃
+            async for part in stream:
+                received += len(part)
+            return received
+
+        # 在开始写入前登记，写入期间到达的重传会被上面的检查忽略
+        state.flushed.add(chunk_index)
+        hasher = state.hasher if state.accepts_hash(chunk_index) else None
+        chunk_path = os.path.join(self._ensure_dir(file_md5, state), f"chunk_{chunk_index:06d}")
+        try:
+            async with await anyio.open_file(chunk_path, "wb") as f:
+                async for part in stream:
+                    await f.write(part)
+                    if hasher is not None:
+                        hasher.update(part)
+                    received += len(part)
+                    # 大分块可能持续较久，期间不应被当作闲置上传清理
+                    state.last_active = time.monotonic()
+        except BaseException:
+            # 写入中断：撤销登记以便客户端重传，已部分计入的摘要也不再可信
+            state.flushed.discard(chunk_index)
+            if hasher is not None:
+                state.hasher = None
+            if os.path.exists(chunk_path):
+                os.remove(chunk_path)
+            raise
+        if hasher is not None:
+            state.hashed_next += 1
+        await self._record_file(file_md5, state, chunk_index, chunk_index + 1)
+        return received
+
+    async def flush(self, file_md5: str):
+        """将该上传仍在内存中的分块写入磁盘"""
+        state = self._uploads.get(file_md5)
+        if state is not None and state.pending is not None:
+            run, state.pending = state.commit(state.pending), None
+            await self._write_run(file_md5, state, run)
+
+    def exists(self, file_md5: str) -> bool:
+        """该上传的分块目录是否存在；本进程创建过的目录无需再访问文件系统"""
+        state = self._uploads.get(file_md5)
+        if state is not None and state.dir_ready:
+            return True
+        return os.path.isdir(self.chunk_dir(file_md5))
+
+    def digest(self, file_md5: str) -> Optional[str]:
+        """
+        返回整个上传内容的 SHA-256 摘要。
+
+        摘要在分块写入时顺带计算，只有全部分块都按顺序到达时才可用，否则返回 None。
+        """
+        state = self._uploads.get(file_md5)
+        if state is None or state.hasher is None or state.hashed_next != state.total:
+            return None
+        return state.hasher.hexdigest()
+
+    def list_chunks(self, file_md5: str) -> List[str]:
+        """按序号顺序返回已落盘的分块文件名"""
+        state = self._uploads.get(file_md5)
+        if state is not None:
+            starts = state.files
+        else:
+            # 进程重启后内存状态丢失，依次回退到 manifest 与目录列表
+            base_dir = self.chunk_dir(file_md5)
+            manifest_path = os.path.join(base_dir, MANIFEST_NAME)
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    starts = [int(line.split()[0]) for line in f if line.strip()]
+            else:
+                starts = [int(f.split("_")[1]) for f in os.listdir(base_dir) if f.startswith("chunk_")]
+
+        starts = list(dict.fromkeys(starts))
+        if any(a > b for a, b in zip(starts, starts[1:])):
+            starts.sort()
+        return [f"chunk_{start:06d}" for start in starts]
+
+    def forget(self, file_md5: str):
+        """丢弃该上传的进程内状态"""
+        self._uploads.pop(file_md5, None)
+
+    def remove(self, file_md5: str, chunk_files: List[str]):
+        """删除该上传的分块文件、清单与目录，并丢弃进程内状态"""
+        base_dir = self.chunk_dir(file_md5)
+        for f in chunk_files:
+            os.remove(os.path.join(base_dir, f))
+        manifest_path = os.path.join(base_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        os.rmdir(base_dir)
+        self.forget(file_md5)
+
+    async def _write_run(self, file_md5: str, state: _UploadState, run: _PendingRun):
+        chunk_path = os.path.join(self._ensure_dir(file_md5, state), f"chunk_{run.start:06d}")
+        async with await anyio.open_file(chunk_path, "wb") as f:
+            await f.write(run.buffer)
+        await self._record_file(file_md5, state, run.start, run.next_index)
+
+    def _get_state(self, file_md5: str) -> _UploadState:
+        """取得该上传的状态并刷新活动时间；状态已被清理或进程重启过时从 manifest 恢复"""
+        state = self._uploads.get(file_md5)
+        if state is None:
+            state = self._uploads[file_md5] = self._load_state(file_md5)
+        state.last_active = time.monotonic()
+        return state
+
+    def _load_state(self, file_md5: str) -> _UploadState:
+        """按 manifest 重建已落盘分块的范围，使重传的分块不会被重复写入"""
+        state = _UploadState()
+        manifest_path = os.path.join(self.chunk_dir(file_md5), MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return state
+        with open(manifest_path) as f:
+            for line in f:
+                fields = line.split()
+                if not fields:
+                    continue
+                start = int(fields[0])
+                end = int(fields[1]) if len(fields) > 1 else start + 1
+                state.files.append(start)
+                state.flushed.update(range(start, end))
+        state.dir_ready = True
+        # 之前落盘的内容未计入本次摘要，摘要不可用
+        state.hasher = None
+        return state
+
+    def _over_budget_runs(self) -> list:
+        """内存缓冲总量超出 max_buffered_bytes 时，按最久未活动优先取出待落盘的数据段"""
+        buffered = {md5: state for md5, state in self._uploads.items() if state.pending is not None}
+        total = sum(len(state.pending.buffer) for state in buffered.values())
+        runs = []
+        for md5, state in sorted(buffered.items(), key=lambda item: item[1].last_active):
+            if total <= self.max_buffered_bytes:
+                break
+            total -= len(state.pending.buffer)
+            runs.append((md5, state, state.commit(state.pending)))
+            state.pending = None
+        return runs
+
+    def _ensure_dir(self, file_md5: str, state: _UploadState) -> str:
+        """返回该上传的分块目录，仅在首次落盘时创建"""
+        base_dir = self.chunk_dir(file_md5)
+        if not state.dir_ready:
+            os.makedirs(base_dir, exist_ok=True)
+            state.dir_ready = True
+        return base_dir
+
+    async def _record_file(self, file_md5: str, state: _UploadState, start: int, end: int):
+        """登记一个新落盘的分块文件，end 为其包含的最后一个分块序号加一"""
+        state.files.append(start)
+        manifest_path = os.path.join(self.chunk_dir(file_md5), MANIFEST_NAME)
+        async with await anyio.open_file(manifest_path, "a") as f:
+            await f.write(f"{start:06d} {end:06d}\n")
+
+
+def _preallocate(src_paths: List[str], dst_path: str) -> List[int]:
+    """创建目标文件并预先扩展到所有分块的总长度，返回各分块大小"""
+    sizes = [os.path.getsize(p) for p in src_paths]
+    with open(dst_path, "wb") as f:
+        f.truncate(sum(sizes))
+    return sizes
+
+
+def _copy_into(src_path: str, dst_path: str, offset: int, size: int):
+    """
+    将 src_path 的全部内容写入 dst_path 的 offset 处。
+
+    每次调用都使用独立的文件描述符，互不共享文件位置，因此可以并发执行；
+    Linux 下使用 os.sendfile 在内核中完成零拷贝。
+    """
+    if sys.platform.startswith("linux"):
+        out_fd = os.open(dst_path, os.O_WRONLY)
+        try:
+            in_fd = os.open(src_path, os.O_RDONLY)
+            try:
+                os.lseek(out_fd, offset, os.SEEK_SET)
+                copied = 0
+                while copied < size:
+                    sent = os.sendfile(out_fd, in_fd, copied, size - copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+            finally:
+                os.close(in_fd)
+        finally:
+            os.close(out_fd)
+    else:
+        with open(src_path, "rb") as infile, open(dst_path, "r+b") as outfile:
+            outfile.seek(offset)
+            shutil.copyfileobj(infile, outfile, COPY_BUFFER_SIZE)
+
+
+async def concat_files(src_paths: List[str], dst_path: str, max_workers: int = 8):
+    """
+    按顺序将多个文件拼接到 dst_path。
+
+    先按各分块大小算出其在目标文件中的偏移，再在线程池中并发拷贝，
+    让存储设备同时处理多个读写请求，而不是逐个等待。
+    """
+    sizes = await to_thread.run_sync(_preallocate, src_paths, dst_path)
+    limiter = anyio.CapacityLimiter(max(1, max_workers))
+
+    async def _copy(src_path: str, offset: int, size: int):
+        await to_thread.run_sync(_copy_into, src_path, dst_path, offset, size, limiter=limiter)
+
+    async with anyio.create_task_group() as tg:
+        for src_path, offset, size in zip(src_paths, itertools.accumulate([0] + sizes[:-1]), sizes):
+            tg.start_soon(_copy, src_path, offset, size)
+
+
+# 在 main.py 的 lifespan 中初始化
+chunk_store_instance: ChunkStore = None
+
+
+def initialize_chunk_store(
+        root_dir: str = None,
+        flush_threshold: int = 4 * 1024 * 1024,
+        max_buffered_bytes: int = 256 * 1024 * 1024,
+        idle_ttl: float = 600
+) -> ChunkStore:
+    """初始化分块存储单例并启动闲置清理任务，须在事件循环中调用"""
+    global chunk_store_instance
+    if chunk_store_instance is None:
+        chunk_store_instance = ChunkStore(
+            root_dir=root_dir,
+            flush_threshold=flush_threshold,
+            max_buffered_bytes=max_buffered_bytes,
+            idle_ttl=idle_ttl,
+        )
+        chunk_store_instance.start()
+    return chunk_store_instance
+
+
+async def shutdown_chunk_store():
+    """停止清理任务、落盘剩余分块并释放分块存储单例"""
+    global chunk_store_instance
+    if chunk_store_instance is not None:
+        await chunk_store_instance.stop()
+        chunk_store_instance = None
+
+
+def get_chunk_store() -> ChunkStore:
+    """
+    获取分块存储实例
+
+    Raises:
+        RuntimeError: 如果分块存储未初始化
+    """
+    if chunk_store_instance is None:
+        raise RuntimeError("Chunk store not initialized. Call initialize_chunk_store() first.")
+    return chunk_store_instance
@@ -1,17 +1,24 @@
-from datetime import timedelta
+import functools
+import itertools
+from dataclasses import dataclass
+from typing import List
 
 
+@functools.lru_cache(maxsize=4096)
 def _format_timestamp(milliseconds: int) -> str:
     """将毫秒转换为 SRT/VTT 时间戳格式 (HH:MM:SS,ms)"""
-    td = timedelta(milliseconds=milliseconds)
-    total_seconds = int(td.total_seconds())
-    ms = td.microseconds // 1000
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
+    seconds, ms = divmod(int(milliseconds), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
     return f"{hours:02}:{minutes:02}:{seconds:02},{ms:03}"
 
 
+@functools.lru_cache(maxsize=4096)
+def _format_vtt_timestamp(milliseconds: int) -> str:
+    """将毫秒转换为 VTT 时间戳格式 (HH:MM:SS.ms)"""
+    return _format_timestamp(milliseconds).replace(",", ".")
+
+
 def to_text(result: dict) -> str:
     """转换为纯文本格式"""
     return result.get("text", "")
@@ -22,39 +29,62 @@ def to_simple_json(result: dict) -> dict:
     return {"text": result.get("text", "")}
 
 
+@dataclass(slots=True)
+class Segment:
+    """归一化后的字幕片段：毫秒时间戳与去除首尾空白的文本"""
+    start_ms: int
+    end_ms: int
+    text: str
+
+
+def normalize(result: dict) -> List[Segment]:
+    """
+    将识别结果中的 sentence_info 归一化为 Segment 列表。
+
+    同一结果需要输出多种字幕格式时，先归一化一次再分别传给 to_srt/to_vtt，避免重复取值与 strip。
+    """
+    return [Segment(int(sent['start']), int(sent['end']), sent['text'].strip()) for sent in result.get("sentence_info", [])]
+
+
 def to_verbose_json(result: dict) -> dict:
     """转换为 OpenAI 的详细 JSON 格式"""
     new_result = {key: value for key, value in result.items() if key != 'timestamp'}
 
     if 'sentence_info' in new_result:
-        processed_sentences = []
-        for sentence_dict in new_result['sentence_info']:
-            new_sentence = {key: value for key, value in sentence_dict.items() if key != 'timestamp'}
-            processed_sentences.append(new_sentence)
-        new_result['sentence_info'] = processed_sentences
+        new_result['sentence_info'] = [
+            {key: value for key, value in sentence_dict.items() if key != 'timestamp'}
+            for sentence_dict in new_result['sentence_info']
+        ]
 
     return new_result
 
 
+@functools.singledispatch
 def to_srt(result: dict) -> str:
-    """转换为 SRT 字幕格式"""
-    sentences = result.get("sentence_info", [])
-    srt_content = []
-    for i, sent in enumerate(sentences):
-        start_time = _format_timestamp(sent['start'])
-        end_time = _format_timestamp(sent['end'])
-        text = sent['text'].strip()
-        srt_content.append(f"{i + 1}\n{start_time} --> {end_time}\n{text}\n")
-    return "\n".join(srt_content)
+    """转换为 SRT 字幕格式，也接受 normalize() 的结果"""
+    return to_srt(normalize(result))
+
+
+@to_srt.register
+def _(segments: list) -> str:
+    return "\n".join(
+        f"{i}\n{_format_timestamp(seg.start_ms)} --> {_format_timestamp(seg.end_ms)}\n{seg.text}\n"
+        for i, seg in enumerate(segments, 1)
+    )
 
 
+@functools.singledispatch
 def to_vtt(result: dict) -> str:
-    """转换为 VTT 字幕格式"""
-    sentences = result.get("sentence_info", [])
-    vtt_content = ["WEBVTT\n"]
-    for sent in sentences:
-        start_time = _format_timestamp(sent['start']).replace(",", ".")
-        end_time = _format_timestamp(sent['end']).replace(",", ".")
-        text = sent['text'].strip()
-        vtt_content.append(f"{start_time} --> {end_time}\n{text}\n")
-    return "\n".join(vtt_content)
\ No newline at end of file
+    """转换为 VTT 字幕格式，也接受 normalize() 的结果"""
+    return to_vtt(normalize(result))
+
+
+@to_vtt.register
+def _(segments: list) -> str:
+    return "\n".join(itertools.chain(
+        ("WEBVTT\n",),
+        (
+            f"{_format_vtt_timestamp(seg.start_ms)} --> {_format_vtt_timestamp(seg.end_ms)}\n{seg.text}\n"
+            for seg in segments
+        ),
+    ))
@@ -0,0 +1,48 @@
+from typing import Optional
+
+import httpx
+
+# 在 main.py 的 lifespan 中初始化，所有远程下载共用同一个连接池
+http_client_instance: Optional[httpx.AsyncClient] = None
+
+
+def initialize_http_client(timeout: float = 60.0, max_connections: int = 64) -> httpx.AsyncClient:
+    """
+    创建共享的 HTTP 客户端，启用 HTTP/2 与 keep-alive 以复用连接和 TLS 握手
+
+    Args:
+        timeout (float): 连接、读写的超时时间（秒）
+        max_connections (int): 连接池的最大连接数
+
+    Returns:
+        httpx.AsyncClient: 共享的异步 HTTP 客户端
+    """
+    global http_client_instance
+    if http_client_instance is None:
+        http_client_instance = httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections),
+        )
+    return http_client_instance
+
+
+async def shutdown_http_client():
+    """关闭共享的 HTTP 客户端"""
+    global http_client_instance
+    if http_client_instance is not None:
+        await http_client_instance.aclose()
+        http_client_instance = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    获取共享的 HTTP 客户端
+
+    Raises:
+        RuntimeError: 如果客户端未初始化
+    """
+    if http_client_instance is None:
+        raise RuntimeError("HTTP client not initialized. Call initialize_http_client() first.")
+    return http_client_instance
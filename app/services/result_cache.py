@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TranscriptionCache:
+    """
+    以 (音频内容摘要, 热词) 为键的识别结果 LRU 缓存。
+
+    只在事件循环中访问，无需加锁。maxsize 为 0 时不缓存任何结果。
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        result = self._data.get(key)
+        if result is not None:
+            self._data.move_to_end(key)
+        return result
+
+    def put(self, key: Hashable, result: Dict[str, Any]):
+        if self.maxsize <= 0 or result is None:
+            return
+        self._data[key] = result
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+# 在 main.py 的 lifespan 中初始化
+transcription_cache_instance: TranscriptionCache = None
+
+
+def initialize_transcription_cache(maxsize: int = 1024) -> TranscriptionCache:
+    """初始化识别结果缓存单例"""
+    global transcription_cache_instance
+    if transcription_cache_instance is None:
+        transcription_cache_instance = TranscriptionCache(maxsize=maxsize)
+    return transcription_cache_instance
+
+
+def get_transcription_cache() -> TranscriptionCache:
+    """
+    获取识别结果缓存实例
+
+    Raises:
+        RuntimeError: 如果缓存未初始化
+    """
+    if transcription_cache_instance is None:
+        raise RuntimeError("Transcription cache not initialized. Call initialize_transcription_cache() first.")
+    return transcription_cache_instance
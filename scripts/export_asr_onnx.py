@@ -0,0 +1,49 @@
+"""
+将 ASR、VAD、标点模型导出为 ONNX，并生成 int8 动态量化版本（model_quant.onnx），供 ASR_BACKEND=onnx_int8 使用。
+
+用法（在项目根目录执行）：
+    python scripts/export_asr_onnx.py
+    python scripts/export_asr_onnx.py --models iic/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch
+
+模型快照下载到 MODEL_CACHE_DIR，导出结果写入快照目录；onnx_int8 后端以同一 cache_dir 加载时会直接使用。
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from funasr import AutoModel
+from modelscope.hub.snapshot_download import snapshot_download
+
+from app.core.config import settings
+
+
+def export_model(model_id: str, quantize: bool = True) -> str:
+    """导出单个模型，返回导出目录"""
+    # 先下载到与服务相同的缓存目录，再从本地目录加载，导出文件才会落在服务读取的位置
+    model_dir = snapshot_download(model_id, cache_dir=settings.MODEL_CACHE_DIR)
+    model = AutoModel(model=model_dir, device="cpu", disable_update=True)
+    # FunASR 导出 model.onnx，quantize=True 时再用 onnxruntime 动态量化生成 model_quant.onnx
+    return model.export(type="onnx", quantize=quantize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export FunASR models to (int8) ONNX")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=[settings.FUNASR_MODEL_ID, settings.VAD_MODEL_ID, settings.PUNC_MODEL_ID],
+        help="ModelScope model IDs to export (default: ASR, VAD and PUNC models from settings)",
+    )
+    parser.add_argument("--no-quantize", action="store_true", help="Only export fp32 model.onnx")
+    args = parser.parse_args()
+
+    for model_id in args.models:
+        print(f"Exporting {model_id} ...")
+        export_dir = export_model(model_id, quantize=not args.no_quantize)
+        print(f"Exported {model_id} to {export_dir}")
+
+
+if __name__ == "__main__":
+    main()